@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+import requests
+from requests.adapters import HTTPAdapter
+
+def create_session(token, pool_size, retry):
+    """
+    Create a requests session for the App Store Connect API, shared by all worker threads.
+    
+    All requests go to a single host, so the session keeps one pool with one keep-alive
+    connection per worker thread. pool_block makes threads wait for an idle connection
+    instead of opening throwaway extras.
+    
+    Args:
+        token (str): The App Store Connect API token
+        pool_size (int): Number of pooled connections, normally the caller's worker count
+        retry (urllib3.util.retry.Retry): Retry policy for the caller's requests
+        
+    Returns:
+        requests.Session: Session with auth headers, retries and connection pooling
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/json"
+    })
+    return session
@@ -4,9 +4,10 @@ import jwt
 import json
 import requests
 import os
-from datetime import datetime, timedelta
+import time
 from pathlib import Path
 from dotenv import load_dotenv
+from cryptography.hazmat.primitives import serialization
 
 # Load environment variables
 load_dotenv()
@@ -16,37 +17,58 @@ ISSUER_ID = os.getenv('APPSTORE_ISSUER_ID')
 KEY_ID = os.getenv('APPSTORE_KEY_ID')
 PRIVATE_KEY_PATH = os.getenv('APPSTORE_PRIVATE_KEY_PATH')
 
+if not all([ISSUER_ID, KEY_ID, PRIVATE_KEY_PATH]):
+    raise ValueError("Missing required environment variables. Please check your .env file.")
+
+# Static JWT header and claims; only 'exp' changes between tokens
+_HEADERS = {
+    'kid': KEY_ID,
+    'typ': 'JWT'
+}
+_PAYLOAD_BASE = {
+    'iss': ISSUER_ID,
+    'aud': 'appstoreconnect-v1'
+}
+
+# Parsed private key and last issued token, reused across calls
+_PRIVATE_KEY = None
+_CACHED = {'token': None, 'exp': 0}
+
+def _load_private_key():
+    """Load and parse the private key once, returning the cached key object afterwards."""
+    global _PRIVATE_KEY
+    if _PRIVATE_KEY is None:
+        try:
+            with open(PRIVATE_KEY_PATH, 'rb') as key_file:
+                _PRIVATE_KEY = serialization.load_pem_private_key(key_file.read(), password=None)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Private key file not found at {PRIVATE_KEY_PATH}")
+    return _PRIVATE_KEY
+
 def create_token():
     """Create a JWT token for App Store Connect API authentication."""
-    if not all([ISSUER_ID, KEY_ID, PRIVATE_KEY_PATH]):
-        raise ValueError("Missing required environment variables. Please check your .env file.")
+    private_key = _load_private_key()
     
-    try:
-        with open(PRIVATE_KEY_PATH, 'r') as key_file:
-            private_key = key_file.read()
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Private key file not found at {PRIVATE_KEY_PATH}")
-    
-    payload = {
-        'iss': ISSUER_ID,
-        'exp': int((datetime.now() + timedelta(minutes=20)).timestamp()),
-        'aud': 'appstoreconnect-v1'
-    }
-    
-    headers = {
-        'kid': KEY_ID,
-        'typ': 'JWT'
-    }
+    payload = {**_PAYLOAD_BASE, 'exp': int(time.time()) + 20 * 60}
     
     token = jwt.encode(
         payload,
         private_key,
         algorithm='ES256',
-        headers=headers
+        headers=_HEADERS
     )
     
+    _CACHED['token'] = token
+    _CACHED['exp'] = payload['exp']
+    
     return token
 
+def get_cached_token():
+    """Return the last token from create_token, signing a new one only if it expires within a minute."""
+    if time.time() < _CACHED['exp'] - 60:
+        return _CACHED['token']
+    return create_token()
+
 if __name__ == "__main__":
     token = create_token()
     print(token) 
\ No newline at end of file
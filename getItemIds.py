@@ -1,54 +1,79 @@
 import requests
-import json
+import orjson
 import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib3.util.retry import Retry
 
-def fetch_apps(token):
+from api_session import create_session
+
+# Number of apps whose in-app purchases are fetched concurrently
+MAX_WORKERS = 10
+
+# Only GETs are made here, so urllib3's default allowed_methods apply; listings are cheap to
+# repeat, so fewer and shorter retries than updatePrice.py. raise_on_status=False hands the
+# last response to raise_for_status so Apple's error body is still printed.
+RETRY = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+
+def paginate(session, url):
+    """
+    Yield every resource of a paged App Store Connect API collection, following links.next
+    
+    Args:
+        session (requests.Session): Session created by api_session.create_session
+        url (str): URL of the first page
+        
+    Yields:
+        dict: Resource objects from each page's 'data' array
+        
+    Raises:
+        requests.exceptions.RequestException: If any page request fails
+        orjson.JSONDecodeError: If a page body is not valid JSON
+    """
+    while url:
+        response = session.get(url)
+        response.raise_for_status()
+        
+        data = orjson.loads(response.content)
+        yield from data.get('data', [])
+        url = data.get('links', {}).get('next')
+
+def fetch_apps(session):
     """
     Fetch app names and IDs from App Store Connect API
     
     Args:
-        token (str): App Store Connect API token
+        session (requests.Session): Session created by api_session.create_session
         
     Returns:
         list: List of dictionaries containing app information
     """
-    endpoint = "https://api.appstoreconnect.apple.com/v1/apps?fields[apps]=name,bundleId"
-    
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+    endpoint = "https://api.appstoreconnect.apple.com/v1/apps?fields[apps]=name,bundleId&limit=200"
     
     try:
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        
-        data = response.json()
-        apps = []
-        
-        if 'data' in data:
-            for app in data['data']:
-                app_info = {
-                    'id': app['id'],
-                    'name': app['attributes']['name'] if 'attributes' in app and 'name' in app['attributes'] else 'Unknown',
-                    'bundleId': app['attributes']['bundleId'] if 'attributes' in app and 'bundleId' in app['attributes'] else 'Unknown'
-                }
-                apps.append(app_info)
+        apps = [
+            {
+                'id': app['id'],
+                'name': (app.get('attributes') or {}).get('name', 'Unknown'),
+                'bundleId': (app.get('attributes') or {}).get('bundleId', 'Unknown')
+            }
+            for app in paginate(session, endpoint)
+        ]
         
         return apps
     
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error fetching apps: {e}")
         if hasattr(e, 'response') and e.response is not None:
             print(f"Response: {e.response.text}")
         return []
 
-def fetch_in_app_purchases(token, app_id):
+def fetch_in_app_purchases(session, app_id):
     """
     Fetch in-app purchases for a specific app from App Store Connect API
     
     Args:
-        token (str): App Store Connect API token
+        session (requests.Session): Session created by api_session.create_session
         app_id (str): App ID to fetch in-app purchases for
         
     Returns:
@@ -56,30 +81,19 @@ def fetch_in_app_purchases(token, app_id):
     """
     endpoint = f"https://api.appstoreconnect.apple.com/v1/apps/{app_id}/inAppPurchasesV2?limit=200"
     
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
     try:
-        response = requests.get(endpoint, headers=headers)
-        response.raise_for_status()
-        
-        data = response.json()
-        iaps = []
-        
-        if 'data' in data:
-            for iap in data['data']:
-                iap_info = {
-                    'id': iap['id'],
-                    'name': iap['attributes']['name'] if 'attributes' in iap and 'name' in iap['attributes'] else 'Unknown',
-                    'productId': iap['attributes']['productId'] if 'attributes' in iap and 'productId' in iap['attributes'] else 'Unknown'
-                }
-                iaps.append(iap_info)
+        iaps = [
+            {
+                'id': iap['id'],
+                'name': (iap.get('attributes') or {}).get('name', 'Unknown'),
+                'productId': (iap.get('attributes') or {}).get('productId', 'Unknown')
+            }
+            for iap in paginate(session, endpoint)
+        ]
         
         return iaps
     
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
         print(f"Error fetching in-app purchases for app {app_id}: {e}")
         if hasattr(e, 'response') and e.response is not None:
             print(f"Response: {e.response.text}")
@@ -87,17 +101,33 @@ def fetch_in_app_purchases(token, app_id):
 
 def main():
     parser = argparse.ArgumentParser(description='Fetch apps and in-app purchases from App Store Connect')
-    parser.add_argument('--token', required=True, help='App Store Connect API token')
+    parser.add_argument('--token', help='App Store Connect API token (default: generated from the .env credentials)')
     args = parser.parse_args()
     
-    apps = fetch_apps(args.token)
+    # Sign a token from the .env credentials once per run when none is given
+    if args.token:
+        token = args.token
+    else:
+        try:
+            # Imported here because the module validates the .env credentials on import
+            from app_store_server_api import get_cached_token
+            token = get_cached_token()
+        except (ValueError, FileNotFoundError) as e:
+            print(f"Error creating token: {e}")
+            sys.exit(1)
+    
+    session = create_session(token, MAX_WORKERS, RETRY)
+    apps = fetch_apps(session)
     
     if apps:
         for app in apps:
             print(f"{app['name']},{app['bundleId']},{app['id']}")
         
-        for app in apps:
-            iaps = fetch_in_app_purchases(args.token, app['id'])
+        # Fetch concurrently, then print in app order to keep the output deterministic
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = list(executor.map(lambda app: (app, fetch_in_app_purchases(session, app['id'])), apps))
+        
+        for app, iaps in results:
             if iaps:
                 for iap in iaps:
                     print(f"{iap['name']},{iap['productId']},{iap['id']},{app['name']}")
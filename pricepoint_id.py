@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import orjson
+
+try:
+    # SIMD-accelerated drop-in replacement for the stdlib module
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+def make_price_point_id(s, t, p):
+    """
+    Create a price point ID: the compact JSON object {"s","t","p"} encoded with unpadded base64url.
+    Base64URL is a URL-safe variant that replaces '+' with '-' and '/' with '_'.
+    
+    Args:
+        s (str): The 's' parameter (app or IAP ID)
+        t (str): The 't' parameter (territory code)
+        p (str): The 'p' parameter (price point code)
+        
+    Returns:
+        str: Base64URL encoded JSON string
+    """
+    return base64.urlsafe_b64encode(orjson.dumps({"s": s, "t": t, "p": p})).rstrip(b'=').decode('utf-8')
+
+def decode_price_point_id(price_point_id: str) -> bytes:
+    """
+    Decode a price point ID back to its JSON bytes.
+    
+    Args:
+        price_point_id (str): Base64URL encoded price point ID, with or without padding
+        
+    Returns:
+        bytes: The decoded JSON
+    """
+    padding = '=' * (-len(price_point_id) % 4)
+    return base64.urlsafe_b64decode(price_point_id + padding)
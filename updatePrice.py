@@ -1,12 +1,85 @@
 #!/usr/bin/env python3
-import json
+import orjson
 import requests
-import subprocess
 import argparse
 import sys
 import csv
+import threading
+import time
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from operator import itemgetter
+from urllib3.util.retry import Retry
+
+from api_session import create_session
+from pricepoint_id import make_price_point_id
+
+# Number of items whose price schedules are updated concurrently
+MAX_WORKERS = 16
+
+# Upper bound on API requests started per second across all worker threads
+REQUESTS_PER_SECOND = 10
+
+class RateLimiter:
+    """
+    Token bucket that spaces out API requests shared by all worker threads, so throughput
+    stays just below Apple's rate limit instead of bursting into 429 responses.
+    Use as a context manager: entering blocks until the next token is available.
+    """
+    def __init__(self, rate):
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+    
+    def __enter__(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if wait > 0:
+            time.sleep(wait)
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+RATE_LIMITER = RateLimiter(REQUESTS_PER_SECOND)
+
+# POST is retried too: submitting a price schedule replaces the previous one, so it is safe to repeat.
+# More and longer retries than getItemIds.py, since a failed item means a schedule left unchanged.
+# raise_on_status=False hands the last response to raise_for_status so Apple's error body is still printed.
+RETRY = Retry(
+    total=5,
+    backoff_factor=1.0,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET", "POST"],
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# JSON:API type names and endpoints for each supported item type
+ITEM_TYPES = {
+    "apps": {
+        "product_type":  "app",
+        "products_type": "apps",
+        "prices_type": "appPrices",
+        "price_point_type":  "appPricePoint",
+        "price_points_type": "appPricePoints",
+        "schedule_type": "appPriceSchedules",
+        "endpoint": "https://api.appstoreconnect.apple.com/v1/appPriceSchedules"
+    },
+    "inAppPurchases": {
+        "product_type":  "inAppPurchase",
+        "products_type": "inAppPurchases",
+        "prices_type": "inAppPurchasePrices",
+        "price_point_type":  "inAppPurchasePricePoint",
+        "price_points_type": "inAppPurchasePricePoints",
+        "schedule_type": "inAppPurchasePriceSchedules",
+        "endpoint": "https://api.appstoreconnect.apple.com/v1/inAppPurchasePriceSchedules"
+    }
+}
 
 def get_item_type_definitions(item_type: str) -> dict:
     """
@@ -21,35 +94,16 @@ def get_item_type_definitions(item_type: str) -> dict:
     Raises:
         ValueError: If item_type is not 'apps' or 'inAppPurchases'
     """
-    ITEM_TYPES = {
-        "apps": {
-            "product_type":  "app",
-            "products_type": "apps",
-            "prices_type": "appPrices",
-            "price_point_type":  "appPricePoint",
-            "price_points_type": "appPricePoints",
-            "schedule_type": "appPriceSchedules",
-            "endpoint": "https://api.appstoreconnect.apple.com/v1/appPriceSchedules"
-        },
-        "inAppPurchases": {
-            "product_type":  "inAppPurchase",
-            "products_type": "inAppPurchases",
-            "prices_type": "inAppPurchasePrices",
-            "price_point_type":  "inAppPurchasePricePoint",
-            "price_points_type": "inAppPurchasePricePoints",
-            "schedule_type": "inAppPurchasePriceSchedules",
-            "endpoint": "https://api.appstoreconnect.apple.com/v1/inAppPurchasePriceSchedules"
-        }
-    }
-    
     if item_type not in ITEM_TYPES:
         raise ValueError(f"Invalid item_type: {item_type}. Must be 'apps' or 'inAppPurchases'")
     
     return ITEM_TYPES[item_type]
 
+@lru_cache(maxsize=None)
 def get_price_point_id(app_id, territory, price_point):
     """
-    Get the price point ID using the createPricePointID.py script
+    Get the price point ID using pricepoint_id.make_price_point_id.
+    Results are cached, so each (app_id, territory, price_point) is encoded once per run.
     
     Args:
         app_id (str): The app ID
@@ -60,17 +114,9 @@ def get_price_point_id(app_id, territory, price_point):
         str: The base64 encoded price point ID
     """
     try:
-        result = subprocess.run(
-            ['python3', 'createPricePointID.py', '--s', app_id, '--t', territory, '--p', price_point],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        # The script prints the encoded ID on the last line
-        return result.stdout.strip().split('\n')[-1]
-    except subprocess.CalledProcessError as e:
+        return make_price_point_id(app_id, territory, price_point)
+    except (TypeError, ValueError) as e:
         print(f"Error getting price point ID: {e}")
-        print(f"Error output: {e.stderr}")
         sys.exit(1)
 
 def prepare_price_data(price: dict, index: int, types: dict, app_id: str) -> tuple:
@@ -88,23 +134,26 @@ def prepare_price_data(price: dict, index: int, types: dict, app_id: str) -> tup
     """
     territory = price.get('territory')
     price_point = price.get('price')
+    start_date = price.get('startDate')
+    end_date = price.get('endDate')
     
     # Get the price point ID
     price_point_id = get_price_point_id(app_id, territory, price_point)
     
     # Create a unique ID for this price
     price_id = "${price-" + str(index) + "}"
+    prices_type = types["prices_type"]
     
     # Create manual price data
     manual_price_data = {
-        "type": types["prices_type"],
+        "type": prices_type,
         "id": price_id
     }
     
     # Create included price data
     included_price_data = {
         "id": price_id,
-        "type": types["prices_type"],
+        "type": prices_type,
         "relationships": {
             types["price_point_type"]: {
                 "data": {
@@ -116,23 +165,19 @@ def prepare_price_data(price: dict, index: int, types: dict, app_id: str) -> tup
     }
     
     # Add start and end dates if provided
-    attributes = {}
-    if price.get('startDate'):
-        attributes['startDate'] = price.get('startDate')
-    if price.get('endDate'):
-        attributes['endDate'] = price.get('endDate')
-    
-    if attributes:
-        included_price_data['attributes'] = attributes
+    if start_date or end_date:
+        included_price_data['attributes'] = {
+            key: value for key, value in (('startDate', start_date), ('endDate', end_date)) if value
+        }
         
     return manual_price_data, included_price_data
 
-def update_price_schedule(token, app_id, item_type, prices, dry_run=False):
+def update_price_schedule(session, app_id, item_type, prices, dry_run=False):
     """
     Update the price schedule for an app or IAP
     
     Args:
-        token (str): The App Store Connect API token
+        session (requests.Session): Session created by api_session.create_session
         app_id (str): The app or IAP ID
         item_type (str): Either 'apps' or 'inAppPurchases'
         prices (list): List of price objects with territory, price, startDate, and endDate
@@ -147,14 +192,9 @@ def update_price_schedule(token, app_id, item_type, prices, dry_run=False):
     # Get type definitions for the item type
     types = get_item_type_definitions(item_type)
     
-    # Prepare the manual prices data
-    manual_prices_data = []
-    included_data = []
-    
-    for i, price in enumerate(prices):
-        manual_price_data, included_price_data = prepare_price_data(price, i, types, app_id)
-        manual_prices_data.append(manual_price_data)
-        included_data.append(included_price_data)
+    # Prepare the manual prices and included data in a single pass
+    pairs = [prepare_price_data(price, i, types, app_id) for i, price in enumerate(prices)]
+    manual_prices_data, included_data = map(list, zip(*pairs))
     
     # Prepare the JSON payload
     payload = {
@@ -182,18 +222,15 @@ def update_price_schedule(token, app_id, item_type, prices, dry_run=False):
     }
     
     if dry_run:
-        print(f"Dry run: Payload for {item_type} {app_id}:")
-        print(json.dumps(payload, indent=2))
+        # Single print so output from concurrent workers is not interleaved
+        print(f"Dry run: Payload for {item_type} {app_id}:\n{orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()}")
         return True
     
     # Make the API request
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    
     try:
-        response = requests.post(types["endpoint"], headers=headers, json=payload)
+        # Serialize with orjson; the session already sets the JSON Content-Type
+        with RATE_LIMITER:
+            response = session.post(types["endpoint"], data=orjson.dumps(payload))
         response.raise_for_status()
         print(f"Successfully updated price schedule for {item_type} {app_id}")
         return True
@@ -206,7 +243,7 @@ def update_price_schedule(token, app_id, item_type, prices, dry_run=False):
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Update App Store Connect price schedules')
-    parser.add_argument('--token', required=True, help='App Store Connect API token')
+    parser.add_argument('--token', help='App Store Connect API token (default: generated from the .env credentials)')
     parser.add_argument('--csv', default='app-price-schedule.csv', help='Path to the CSV file with price schedule data')
     parser.add_argument('--dry-run', action='store_true', help='Print the payload without making the API request')
     args = parser.parse_args()
@@ -214,41 +251,57 @@ def main():
     # Read the CSV file and group items by ID
     try:
         with open(args.csv, 'r') as f:
-            reader = csv.DictReader(f)
+            # Plain csv.reader avoids building a dict per row; columns are picked by index
+            reader = csv.reader(f)
+            fieldnames = next(reader, [])
             
             # Check for required columns
             required_columns = ['input', 'id', 'type', 'territory', 'price', 'start', 'end', 'price_point_id']
-            missing_columns = [col for col in required_columns if col not in reader.fieldnames]
+            missing_columns = [col for col in required_columns if col not in fieldnames]
             if missing_columns:
                 print(f"Error: CSV file is missing required columns: {', '.join(missing_columns)}")
                 sys.exit(1)
             
+            field_count = len(fieldnames)
+            column_index = {name: i for i, name in enumerate(fieldnames)}
+            get_fields = itemgetter(*(column_index[col] for col in
+                                      ['input', 'id', 'type', 'territory', 'start', 'end', 'price_point_id']))
+            
             # Group items by ID
             grouped_items = defaultdict(lambda: {"memo": "", "id": "", "type": "", "prices": []})
             
             for row in reader:
+                # Skip blank lines
+                if not row:
+                    continue
+                    
+                # Pad short rows with None like csv.DictReader does, so they are skipped below
+                if len(row) < field_count:
+                    row += [None] * (field_count - len(row))
+                    
+                memo, item_id, item_type, territory, start, end, price_point_id = get_fields(row)
+                
                 # Skip if memo is empty
-                if not row['input'].strip():
+                if not memo.strip():
                     continue
                     
-                item_id = row['id']
                 if not item_id:
                     continue
                     
                 # Add or update the group
-                if not grouped_items[item_id]["id"]:
-                    grouped_items[item_id]["memo"] = row['input']
-                    grouped_items[item_id]["id"] = item_id
-                    grouped_items[item_id]["type"] = row['type']
+                group = grouped_items[item_id]
+                if not group["id"]:
+                    group["memo"] = memo
+                    group["id"] = item_id
+                    group["type"] = item_type
                 
                 # Add price to the group
-                price = {
-                    'territory': row['territory'],
-                    'price': row['price_point_id'],
-                    'startDate': None if row['start'] == "null" else row['start'],
-                    'endDate': None if row['end'] == "null" else row['end']
-                }
-                grouped_items[item_id]["prices"].append(price)
+                group["prices"].append({
+                    'territory': territory,
+                    'price': price_point_id,
+                    'startDate': None if start == "null" else start,
+                    'endDate': None if end == "null" else end
+                })
             
             # Convert to list for processing
             items = list(grouped_items.values())
@@ -260,25 +313,44 @@ def main():
         print(f"Error reading CSV file: {e}")
         sys.exit(1)
     
-    # Process each item
-    for item in items:
-        app_id = item.get('id')
-        item_type = item.get('type')
-        memo = item.get('memo', 'Unknown')
-        prices = item.get('prices', [])
-        
-        if not app_id or not item_type or not prices:
-            print(f"Skipping item {memo}: Missing required fields")
-            continue
-        
-        print(f"Processing {item_type} {app_id} ({memo}) with {len(prices)} prices")
+    # Sign a token from the .env credentials once per run when none is given
+    if args.token:
+        token = args.token
+    else:
         try:
-            success = update_price_schedule(args.token, app_id, item_type, prices, args.dry_run)
-            if not success:
-                print(f"Failed to update price schedule for {item_type} {app_id}")
-        except ValueError as e:
-            print(f"Error processing {memo}: {e}")
-            continue
+            # Imported here because the module validates the .env credentials on import
+            from app_store_server_api import get_cached_token
+            token = get_cached_token()
+        except (ValueError, FileNotFoundError) as e:
+            print(f"Error creating token: {e}")
+            sys.exit(1)
+    
+    # Process items concurrently; each item is an independent API request
+    session = create_session(token, MAX_WORKERS, RETRY)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {}
+        for item in items:
+            app_id = item.get('id')
+            item_type = item.get('type')
+            memo = item.get('memo', 'Unknown')
+            prices = item.get('prices', [])
+            
+            if not app_id or not item_type or not prices:
+                print(f"Skipping item {memo}: Missing required fields")
+                continue
+            
+            print(f"Processing {item_type} {app_id} ({memo}) with {len(prices)} prices")
+            future = executor.submit(update_price_schedule, session, app_id, item_type, prices, args.dry_run)
+            futures[future] = item
+        
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                success = future.result()
+                if not success:
+                    print(f"Failed to update price schedule for {item['type']} {item['id']}")
+            except ValueError as e:
+                print(f"Error processing {item['memo']}: {e}")
 
 if __name__ == "__main__":
     main()